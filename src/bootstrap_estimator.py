@@ -0,0 +1,259 @@
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from threadpoolctl import threadpool_limits
+
+# Arrays shared by all the tasks of a worker process. They are set once per process by _init_worker, so the price
+# series are not pickled again for every batch of resamples.
+_worker_arrays = {}
+
+
+def _init_worker(arrays, blas_threads=None):
+    """
+    Stores the arrays used by the bootstrap tasks in the current process.
+
+    :param arrays: a dictionary with numpy arrays.
+    :param blas_threads: if given, the count of threads the BLAS library of this process can use. Worker processes
+                         use one thread each, so the pool doesn't oversubscribe the CPUs. Default: None.
+    :return: None
+    """
+    if blas_threads is not None:
+        threadpool_limits(limits=blas_threads, user_api='blas')
+    _worker_arrays.clear()
+    _worker_arrays.update(arrays)
+
+
+def draw_block_bootstrap_weights(rng, resamples, observations, block_size):
+    """
+    Draws moving block bootstrap resamples, expressed as how many times each observation is picked.
+
+    Each resample concatenates blocks of consecutive observations starting at random positions until it has as many
+    observations as the original sample. With block_size=1 it is the classic i.i.d. bootstrap.
+
+    :param rng: a numpy random Generator.
+    :param resamples: the count of resamples to draw.
+    :param observations: the count of observations in the original sample.
+    :param block_size: the count of consecutive observations in each block.
+    :return: a numpy array with shape (resamples, observations) with the count of times each observation is picked.
+    """
+    block_size = min(block_size, observations)
+    blocks_count = -(-observations // block_size)
+    starts = rng.integers(0, observations - block_size + 1, size=(resamples, blocks_count))
+    indexes = (starts[:, :, None] + np.arange(block_size)).reshape(resamples, -1)[:, :observations]
+    indexes = indexes + np.arange(resamples)[:, None] * observations
+    return np.bincount(indexes.ravel(), minlength=resamples * observations).reshape(resamples, observations)
+
+
+def batched_correlation(values, mask, weights):
+    """
+    Estimates the correlation matrices of a batch of weighted resamples with matrix products.
+
+    Missing observations are excluded pairwise, like pandas.DataFrame.corr() does.
+
+    :param values: a numpy array with shape (observations, series), missing values replaced by 0.
+    :param mask: a numpy array with the same shape as values, 1 where the observation is present and 0 otherwise.
+    :param weights: a numpy array with shape (resamples, observations) with the weight of each observation.
+    :return: a numpy array with shape (resamples, series, series) with the correlation matrices.
+    """
+    # A single (resamples, observations, series) buffer holds the weights, first masked and then times the values.
+    weighted = weights[:, :, None] * mask
+    # For each pair (this, other), the sums only include the observations where both series are present.
+    count = mask.T @ weighted
+    sum_this = values.T @ weighted
+    sum_squares_this = (values ** 2).T @ weighted
+    # The missing values are 0, so weighting the mask and then the values is the same as weighting the values.
+    weighted *= values
+    sum_products = values.T @ weighted
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_this = sum_this / count
+        mean_other = mean_this.transpose(0, 2, 1)
+        variance_this = sum_squares_this / count - mean_this ** 2
+        variance_other = variance_this.transpose(0, 2, 1)
+        covariance = sum_products / count - mean_this * mean_other
+        correlation = covariance / np.sqrt(variance_this * variance_other)
+    return np.clip(correlation, -1, 1)
+
+
+def batched_mean_by_hour(values, mask, hours, weights):
+    """
+    Estimates the mean by hour of a batch of weighted resamples with matrix products.
+
+    :param values: a numpy array with shape (observations, series), missing values replaced by 0.
+    :param mask: a numpy array with the same shape as values, 1 where the observation is present and 0 otherwise.
+    :param hours: a one-hot encoded numpy array with shape (observations, 24) with the hour of each observation.
+    :param weights: a numpy array with shape (resamples, observations) with the weight of each observation.
+    :return: a numpy array with shape (resamples, 24, series) with the mean by hour.
+    """
+    weighted_hours = weights[:, None, :] * hours.T
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (weighted_hours @ values) / (weighted_hours @ mask)
+
+
+def _correlation_task(seed, resamples):
+    """
+    Runs a batch of correlation resamples in a worker process.
+
+    :param seed: a numpy SeedSequence for this batch.
+    :param resamples: the count of resamples in this batch.
+    :return: a numpy array with shape (resamples, pairs) with the correlation of each unique pair.
+    """
+    values, mask = _worker_arrays['values'], _worker_arrays['mask']
+    weights = draw_block_bootstrap_weights(np.random.default_rng(seed), resamples, values.shape[0],
+                                           _worker_arrays['block_size'])
+    rows, columns = np.triu_indices(values.shape[1], k=1)
+    return batched_correlation(values, mask, weights)[:, rows, columns]
+
+
+def _mean_by_hour_task(seed, resamples):
+    """
+    Runs a batch of mean movement by hour resamples in a worker process.
+
+    :param seed: a numpy SeedSequence for this batch.
+    :param resamples: the count of resamples in this batch.
+    :return: a numpy array with shape (resamples, 24, series) with the mean movement by hour.
+    """
+    values, mask = _worker_arrays['values'], _worker_arrays['mask']
+    weights = draw_block_bootstrap_weights(np.random.default_rng(seed), resamples, values.shape[0],
+                                           _worker_arrays['block_size'])
+    return batched_mean_by_hour(values, mask, _worker_arrays['hours'], weights)
+
+
+class BootstrapEstimator:
+    """
+    Estimates bootstrap confidence intervals for the correlations and the mean movement by hour estimated by a
+    DataProcessor.
+
+    The hourly observations are resampled with a moving block bootstrap, so the dependence between consecutive hours
+    and across futures is kept. Each resample is represented as a weight per hour, and batches of resamples are
+    processed with matrix products spread across a process pool. The random numbers of each batch come from its own
+    seed spawned from the estimator's seed, so the results only depend on the seed, the resamples count and the batch
+    size, not on the count of workers.
+    """
+
+    def __init__(self, data_processor, resamples=1000, block_size=24, confidence_level=0.95, batch_size=8,
+                 max_workers=None, seed=0):
+        """
+        Initializes an instance of the BootstrapEstimator class.
+
+        :param data_processor: an instance of DataProcessor.
+        :param resamples: the count of bootstrap resamples. Default: 1000.
+        :param block_size: the count of consecutive hours in each resampled block, use 1 for the i.i.d. bootstrap.
+                           Default: 24.
+        :param confidence_level: the confidence level of the intervals. Default: 0.95.
+        :param batch_size: the count of resamples processed together by a worker. Memory usage grows linearly with
+                           it. Default: 8.
+        :param max_workers: the count of worker processes. If None, it uses all CPUs; if 1, everything runs in the
+                            current process. Default: None.
+        :param seed: the seed of the random numbers generator. Default: 0.
+        """
+        if not 0 < confidence_level < 1:
+            raise ValueError(
+                f'BootstrapEstimator.__init__(): The confidence level must be between 0 and 1, received '
+                f'{confidence_level} instead.')
+        self.data_processor = data_processor
+        self.resamples = resamples
+        self.block_size = block_size
+        self.confidence_level = confidence_level
+        self.batch_size = batch_size
+        self.max_workers = max_workers or os.cpu_count()
+        self.seed = seed
+
+    def estimate_correlation_confidence_intervals(self, log_series=True):
+        """
+        Estimates the confidence intervals of the correlation of every unique pair of futures.
+
+        :param log_series: if True, apply log to all prices series before estimating the correlations, as
+                           DataProcessor.estimate_correlation_matrix() does. Default: True.
+        :return: a pandas DataFrame with columns THIS, OTHER, Correlation, Lower and Upper.
+        """
+        price_series = self.data_processor.hourly_price_series
+        if log_series:
+            price_series = np.log(price_series)
+        # Centering the series reduces the rounding errors of the sums of squares.
+        values, mask = self._to_arrays(price_series - price_series.mean())
+        print(f'BootstrapEstimator: Estimating correlation confidence intervals with {self.resamples} resamples.')
+        resampled_correlations = self._run_resamples(_correlation_task, {'values': values, 'mask': mask})
+        lower, upper = self._estimate_interval(resampled_correlations)
+        # The point estimates come from the same computation with unit weights, so they are always the exact
+        # correlations the intervals refer to, even if the DataProcessor approximates its correlation matrix.
+        rows, columns = np.triu_indices(values.shape[1], k=1)
+        correlation = batched_correlation(values, mask, np.ones((1, values.shape[0])))[0][rows, columns]
+        futures = np.array(price_series.columns, dtype=object)
+        return pd.DataFrame({'THIS': futures[rows], 'OTHER': futures[columns], 'Correlation': correlation,
+                             'Lower': lower, 'Upper': upper})
+
+    def estimate_mean_movement_by_hour_confidence_intervals(self, normalize=False, absolute_value=False):
+        """
+        Estimates the confidence intervals of the mean movement by hour of all futures.
+
+        :param normalize: if True we normalize the prices before processing. Default False
+        :param absolute_value: if True we use the absolute value of the first differences. Default False
+        :return: a pandas DataFrame indexed by hour, with the Mean Movement, Lower and Upper columns for each future.
+        """
+        first_diff = self.data_processor.estimate_hourly_first_diff(normalize, absolute_value)
+        values, mask = self._to_arrays(first_diff)
+        hours = np.eye(24)[first_diff.index.hour]
+        print(f'BootstrapEstimator: Estimating mean movement by hour confidence intervals with {self.resamples} '
+              f'resamples.')
+        resampled_means = self._run_resamples(_mean_by_hour_task, {'values': values, 'mask': mask, 'hours': hours})
+        lower, upper = self._estimate_interval(resampled_means)
+        mean = batched_mean_by_hour(values, mask, hours, np.ones((1, values.shape[0])))[0]
+        df_dic = {name: pd.DataFrame(table, index=pd.RangeIndex(24, name='Hour'), columns=first_diff.columns)
+                  for name, table in {'Mean Movement': mean, 'Lower': lower, 'Upper': upper}.items()}
+        return (pd.concat(df_dic.values(), axis=1, keys=df_dic.keys())
+                .swaplevel(axis=1)
+                .reindex(self.data_processor.futures_list, axis=1, level=0)
+                .dropna(how='all'))
+
+    @staticmethod
+    def _to_arrays(series: pd.DataFrame):
+        """
+        Splits a DataFrame into its values, with missing values replaced by 0, and a mask of the present values.
+
+        :param series: a pandas DataFrame.
+        :return: a tuple with two numpy arrays, the values and the mask.
+        """
+        mask = series.notna().to_numpy(dtype=float)
+        values = series.fillna(0).to_numpy(dtype=float)
+        return values, mask
+
+    def _run_resamples(self, task, arrays):
+        """
+        Runs all the resamples in batches, spread across the process pool.
+
+        :param task: the function that processes a batch of resamples in a worker.
+        :param arrays: a dictionary with the arrays the task uses.
+        :return: a numpy array with the results of all resamples stacked along the first axis.
+        """
+        arrays = {**arrays, 'block_size': self.block_size}
+        batch_sizes = [min(self.batch_size, self.resamples - start)
+                       for start in range(0, self.resamples, self.batch_size)]
+        seeds = np.random.SeedSequence(self.seed).spawn(len(batch_sizes))
+        if self.max_workers == 1:
+            _init_worker(arrays)
+            try:
+                results = list(map(task, seeds, batch_sizes))
+            finally:
+                _worker_arrays.clear()
+        else:
+            with ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_worker,
+                                     initargs=(arrays, 1)) as executor:
+                results = list(executor.map(task, seeds, batch_sizes))
+        return np.concatenate(results)
+
+    def _estimate_interval(self, resampled_statistics):
+        """
+        Estimates the percentile confidence interval of the resampled statistics.
+
+        :param resampled_statistics: a numpy array with the resamples along the first axis.
+        :return: a tuple with the lower and upper bounds.
+        """
+        alpha = (1 - self.confidence_level) / 2
+        with warnings.catch_warnings():
+            # Statistics without data, e.g. the correlation of a pair without overlapping observations, stay NaN.
+            warnings.simplefilter('ignore', RuntimeWarning)
+            lower, upper = np.nanquantile(resampled_statistics, [alpha, 1 - alpha], axis=0)
+        return lower, upper
@@ -1,18 +1,372 @@
+import time
+import warnings
+
 import pandas as pd
 import numpy as np
 
 
+def concat_unique_pairs(blocks):
+    """
+    Concatenates the blocks of unique pairs listed by a correlation matrix.
+
+    :param blocks: an iterable of pandas DataFrames with columns THIS, OTHER and Correlation.
+    :return: a pandas DataFrame with columns THIS, OTHER and Correlation.
+    """
+    blocks = list(blocks)
+    if not blocks:
+        return pd.DataFrame({'THIS': pd.Series(dtype=object), 'OTHER': pd.Series(dtype=object),
+                             'Correlation': pd.Series(dtype=float)})
+    return pd.concat(blocks, ignore_index=True)
+
+
+class CondensedCorrelationMatrix:
+    """
+    Stores a symmetric correlation matrix keeping only its upper triangle (diagonal included) in a flat array.
+
+    A dense N x N matrix holds every pair twice, the condensed form holds N * (N + 1) / 2 values, roughly half the
+    memory. Pair lookups are O(1) and rows are extracted with a single vectorized gather.
+    """
+
+    def __init__(self, labels, values: np.ndarray):
+        """
+        Initializes an instance of the CondensedCorrelationMatrix class.
+
+        :param labels: the futures' names, in the same order used to build the condensed values.
+        :param values: a flat numpy array with the upper triangle of the matrix, stored row by row.
+        """
+        self.labels = list(labels)
+        self.values = np.asarray(values, dtype=float)
+        expected_size = len(self.labels) * (len(self.labels) + 1) // 2
+        if self.values.shape != (expected_size,):
+            raise ValueError(
+                f'CondensedCorrelationMatrix.__init__(): Expected {expected_size} values for {len(self.labels)} '
+                f'futures, received {self.values.shape} instead.')
+        self._positions = {label: position for position, label in enumerate(self.labels)}
+
+    @classmethod
+    def from_frame(cls, correlation_matrix: pd.DataFrame):
+        """
+        Builds a condensed matrix from a dense symmetric correlation matrix.
+
+        :param correlation_matrix: a pandas DataFrame with the same labels in index and columns.
+        :return: a CondensedCorrelationMatrix instance.
+        """
+        dense = correlation_matrix.to_numpy()
+        # Row by row slices avoid allocating index arrays as big as the condensed values.
+        values = np.empty(dense.shape[0] * (dense.shape[0] + 1) // 2)
+        start = 0
+        for i in range(dense.shape[0]):
+            values[start:start + dense.shape[0] - i] = dense[i, i:]
+            start += dense.shape[0] - i
+        return cls(correlation_matrix.columns, values)
+
+    @classmethod
+    def from_series(cls, series: pd.DataFrame, block_size=256):
+        """
+        Estimates the correlation matrix of the given series directly in condensed form, so the dense matrix is never
+        built.
+
+        The correlations are estimated for blocks of futures against the futures that follow them, with matrix
+        products of the pairwise-complete sums. Missing observations are excluded pairwise, like
+        pandas.DataFrame.corr() does.
+
+        :param series: a pandas DataFrame with one series per column.
+        :param block_size: the count of futures whose correlations are estimated together. Default: 256.
+        :return: a CondensedCorrelationMatrix instance.
+        """
+        values = series.to_numpy(dtype=float)
+        mask = ~np.isnan(values)
+        with warnings.catch_warnings():
+            # Series without prices have no mean, their correlations are NaN.
+            warnings.simplefilter('ignore', RuntimeWarning)
+            # Centering the series reduces the rounding errors of the sums of squares.
+            values = values - np.nanmean(values, axis=0)
+        values[~mask] = 0
+        mask = mask.astype(float)
+        squares = values ** 2
+        futures_count = values.shape[1]
+        condensed = np.empty(futures_count * (futures_count + 1) // 2)
+        start = 0
+        for block_start in range(0, futures_count, block_size):
+            block = slice(block_start, min(block_start + block_size, futures_count))
+            # For each pair (this, other), the sums only include the observations where both series are present.
+            count = mask[:, block].T @ mask[:, block_start:]
+            sum_this = values[:, block].T @ mask[:, block_start:]
+            sum_other = mask[:, block].T @ values[:, block_start:]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                covariance = values[:, block].T @ values[:, block_start:] - sum_this * sum_other / count
+                variance_this = squares[:, block].T @ mask[:, block_start:] - sum_this ** 2 / count
+                variance_other = mask[:, block].T @ squares[:, block_start:] - sum_other ** 2 / count
+                correlation = np.clip(covariance / np.sqrt(variance_this * variance_other), -1, 1)
+            for row in range(correlation.shape[0]):
+                condensed[start:start + correlation.shape[1] - row] = correlation[row, row:]
+                start += correlation.shape[1] - row
+        return cls(series.columns, condensed)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __contains__(self, label):
+        return label in self._positions
+
+    def __getitem__(self, pair):
+        """
+        Returns the correlation between the two futures in the pair, e.g. matrix['BTCUSDT', 'ETHUSDT'].
+        """
+        this, other = pair
+        return self.values[self._condensed_index(self._position(this), self._position(other))]
+
+    def _position(self, label):
+        if label not in self._positions:
+            raise KeyError(f'CondensedCorrelationMatrix: Security {label} not present in correlation matrix')
+        return self._positions[label]
+
+    def _condensed_index(self, i, j):
+        """
+        Maps matrix coordinates to positions in the flat array. It works with scalars and numpy arrays.
+        """
+        i, j = np.minimum(i, j), np.maximum(i, j)
+        return i * len(self.labels) - i * (i - 1) // 2 + j - i
+
+    def row(self, label):
+        """
+        Extracts all the correlations of a future.
+
+        :param label: the future.
+        :return: a pandas Series indexed by future.
+        """
+        position = self._position(label)
+        indexes = self._condensed_index(position, np.arange(len(self.labels)))
+        return pd.Series(self.values[indexes], index=self.labels, name=label)
+
+    def submatrix(self, labels):
+        """
+        Builds the dense correlation matrix of a subset of futures.
+
+        :param labels: the futures to include, in the order they should appear.
+        :return: a pandas DataFrame with the correlation matrix of the subset.
+        """
+        labels = list(labels)
+        positions = np.array([self._position(label) for label in labels])
+        indexes = self._condensed_index(positions[:, None], positions[None, :])
+        return pd.DataFrame(self.values[indexes], index=labels, columns=labels)
+
+    def to_frame(self):
+        """
+        Builds the dense correlation matrix of all futures.
+
+        :return: a pandas DataFrame with the correlation matrix.
+        """
+        futures_count = len(self.labels)
+        dense = np.empty((futures_count, futures_count))
+        start = 0
+        for i in range(futures_count):
+            upper_row = self.values[start:start + futures_count - i]
+            dense[i, i:] = upper_row
+            dense[i:, i] = upper_row
+            start += futures_count - i
+        return pd.DataFrame(dense, index=self.labels, columns=self.labels)
+
+    def iter_unique_pairs(self, threshold=None):
+        """
+        Lists every pair of different futures once, one row of the upper triangle at a time, so no index or label
+        arrays as big as the condensed values are allocated.
+
+        :param threshold: if given, only the pairs whose correlation in absolute value is greater or equal to the
+                          threshold are kept. Default: None.
+        :return: a generator of pandas DataFrames with columns THIS, OTHER and Correlation.
+        """
+        futures_count = len(self.labels)
+        labels = np.array(self.labels, dtype=object)
+        start = 0
+        for i in range(futures_count):
+            # The row starts with the diagonal, the pairs with the following futures come after it.
+            correlations = self.values[start + 1:start + futures_count - i]
+            others = labels[i + 1:]
+            if threshold is not None:
+                keep = np.abs(correlations) >= threshold
+                correlations, others = correlations[keep], others[keep]
+            if len(others) > 0:
+                yield pd.DataFrame({'THIS': labels[i:i + 1].repeat(len(others)), 'OTHER': others,
+                                    'Correlation': correlations})
+            start += futures_count - i
+
+    def unique_pairs(self, threshold=None):
+        """
+        Lists every pair of different futures once, i.e. without self-pairs nor mirrored pairs.
+
+        :param threshold: if given, only the pairs whose correlation in absolute value is greater or equal to the
+                          threshold are kept. Default: None.
+        :return: a pandas DataFrame with columns THIS, OTHER and Correlation.
+        """
+        return concat_unique_pairs(self.iter_unique_pairs(threshold))
+
+
+class LowRankCorrelationMatrix:
+    """
+    Approximates a correlation matrix with a low-rank factor form, without building the N x N matrix.
+
+    The standardized series are projected onto their top singular vectors, estimated with a randomized SVD, so each
+    future is represented by a short vector of factor loadings. The correlation of two futures is approximated by the
+    dot product of their loadings, rescaled to unit norm so every future keeps a correlation of 1 with itself. Memory
+    is N x rank, and a full row costs O(N x rank), so top-k / bottom-k queries don't need the whole matrix.
+    """
+
+    def __init__(self, labels, factors: np.ndarray):
+        """
+        Initializes an instance of the LowRankCorrelationMatrix class.
+
+        :param labels: the futures' names, in the same order as the factors' rows.
+        :param factors: a numpy array with shape (futures, rank) with the factor loadings of each future.
+        """
+        self.labels = list(labels)
+        self.factors = np.asarray(factors, dtype=float)
+        if self.factors.ndim != 2 or self.factors.shape[0] != len(self.labels):
+            raise ValueError(
+                f'LowRankCorrelationMatrix.__init__(): Expected one row of factors for each of the '
+                f'{len(self.labels)} futures, received {self.factors.shape} instead.')
+        self._positions = {label: position for position, label in enumerate(self.labels)}
+
+    @classmethod
+    def from_series(cls, series: pd.DataFrame, rank=20, oversamples=10, power_iterations=2, seed=0):
+        """
+        Builds the factor form of the correlation matrix of the given series with a randomized SVD.
+
+        Missing values are replaced by the series' mean after standardizing, instead of excluding them pairwise as the
+        exact correlation does, which shrinks the correlations of series with little overlap towards 0.
+
+        :param series: a pandas DataFrame with one series per column.
+        :param rank: the count of factors kept. Higher ranks are more accurate and slower. Default: 20.
+        :param oversamples: the count of extra random directions used to estimate the factors. Default: 10.
+        :param power_iterations: the count of power iterations, they improve the accuracy when the singular values
+                                 decay slowly at the cost of two extra products with the data each. Default: 2.
+        :param seed: the seed of the random numbers generator. Default: 0.
+        :return: a LowRankCorrelationMatrix instance.
+        """
+        values = series.to_numpy(dtype=float)
+        with warnings.catch_warnings():
+            # Series without prices have no mean, their standardized values are set to 0.
+            warnings.simplefilter('ignore', RuntimeWarning)
+            centered = values - np.nanmean(values, axis=0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            standardized = np.nan_to_num(centered / np.sqrt(np.nansum(centered ** 2, axis=0)))
+        rank = min(rank, *standardized.shape)
+        # Randomized range finder (Halko, Martinsson and Tropp) followed by the SVD of the projected data.
+        random_directions = np.random.default_rng(seed).standard_normal(
+            (standardized.shape[1], min(rank + oversamples, standardized.shape[1])))
+        basis, _ = np.linalg.qr(standardized @ random_directions)
+        for _ in range(power_iterations):
+            basis, _ = np.linalg.qr(standardized.T @ basis)
+            basis, _ = np.linalg.qr(standardized @ basis)
+        _, singular_values, right_vectors = np.linalg.svd(basis.T @ standardized, full_matrices=False)
+        factors = right_vectors[:rank].T * singular_values[:rank]
+        # Series without prices have null factors, the normalization turns them into NaN, so their correlations are
+        # NaN like in the exact correlation matrix.
+        with np.errstate(divide='ignore', invalid='ignore'):
+            factors = factors / np.linalg.norm(factors, axis=1, keepdims=True)
+        return cls(series.columns, factors)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __contains__(self, label):
+        return label in self._positions
+
+    def __getitem__(self, pair):
+        """
+        Returns the approximate correlation between the two futures in the pair, e.g. matrix['BTCUSDT', 'ETHUSDT'].
+        """
+        this, other = pair
+        return self.factors[self._position(this)] @ self.factors[self._position(other)]
+
+    def _position(self, label):
+        if label not in self._positions:
+            raise KeyError(f'LowRankCorrelationMatrix: Security {label} not present in correlation matrix')
+        return self._positions[label]
+
+    def row(self, label):
+        """
+        Approximates all the correlations of a future.
+
+        :param label: the future.
+        :return: a pandas Series indexed by future.
+        """
+        return pd.Series(self.factors @ self.factors[self._position(label)], index=self.labels, name=label)
+
+    def submatrix(self, labels):
+        """
+        Approximates the dense correlation matrix of a subset of futures.
+
+        :param labels: the futures to include, in the order they should appear.
+        :return: a pandas DataFrame with the correlation matrix of the subset.
+        """
+        labels = list(labels)
+        factors = self.factors[[self._position(label) for label in labels]]
+        return pd.DataFrame(factors @ factors.T, index=labels, columns=labels)
+
+    def to_frame(self):
+        """
+        Approximates the dense correlation matrix of all futures.
+
+        :return: a pandas DataFrame with the correlation matrix.
+        """
+        return self.submatrix(self.labels)
+
+    def iter_unique_pairs(self, threshold=None, block_size=256):
+        """
+        Lists every pair of different futures once, in blocks of rows, so only one block of correlations is held in
+        memory at a time.
+
+        :param threshold: if given, only the pairs whose correlation in absolute value is greater or equal to the
+                          threshold are kept. Default: None.
+        :param block_size: the count of rows of the matrix approximated together. Default: 256.
+        :return: a generator of pandas DataFrames with columns THIS, OTHER and Correlation.
+        """
+        labels = np.array(self.labels, dtype=object)
+        for start in range(0, len(self.labels), block_size):
+            rows = np.arange(start, min(start + block_size, len(self.labels)))
+            columns = np.arange(start, len(self.labels))
+            correlations = self.factors[rows] @ self.factors[start:].T
+            # Keep the upper triangle only, i.e. the pairs whose other future comes after this one.
+            keep = columns[None, :] > rows[:, None]
+            if threshold is not None:
+                keep &= np.abs(correlations) >= threshold
+            block_rows, block_columns = np.nonzero(keep)
+            if len(block_rows) == 0:
+                continue
+            yield pd.DataFrame({'THIS': labels[rows[block_rows]], 'OTHER': labels[columns[block_columns]],
+                                'Correlation': correlations[block_rows, block_columns]})
+
+    def unique_pairs(self, threshold=None):
+        """
+        Lists every pair of different futures once, i.e. without self-pairs nor mirrored pairs.
+
+        :param threshold: if given, only the pairs whose correlation in absolute value is greater or equal to the
+                          threshold are kept. Default: None.
+        :return: a pandas DataFrame with columns THIS, OTHER and Correlation.
+        """
+        return concat_unique_pairs(self.iter_unique_pairs(threshold))
+
+
 class DataProcessor:
     """
     Process historical time series of prices and generates statistic of correlation, positive and negative days, and
     price movement by hour.
     """
 
-    def __init__(self, hourly_price_series: pd.DataFrame):
+    def __init__(self, hourly_price_series: pd.DataFrame, correlation_rank=None, correlation_power_iterations=2,
+                 correlation_oversamples=10):
         """
         Initializes an instance of the DataProcessor class.
 
         :param hourly_price_series: a pandas DataFrame with hourly prices of multiple futures.
+        :param correlation_rank: if given, the correlation matrix is approximated with this count of factors instead of
+                                 being estimated exactly. Useful for very large universes. Default: None.
+        :param correlation_power_iterations: the count of power iterations of the randomized SVD used when
+                                             correlation_rank is given. More iterations are more accurate and slower.
+                                             Default: 2.
+        :param correlation_oversamples: the count of extra random directions of the randomized SVD used when
+                                        correlation_rank is given. Default: 10.
         """
         if not isinstance(hourly_price_series, pd.DataFrame):
             raise TypeError(
@@ -20,26 +374,32 @@ class DataProcessor:
         print(f'DataProcessor.main(): Processing data of {hourly_price_series.shape[1]} futures.')
         self.hourly_price_series = hourly_price_series.sort_index(axis=1)
         self.futures_list = sorted(hourly_price_series.columns.to_list())
-        self.daily_price_series = hourly_price_series.resample('1D').last()
-        self.daily_pct_change = self.daily_price_series.pct_change()
-        self.daily_first_diff = self.daily_price_series.diff()
-        self.correlation_matrix = self.estimate_correlation_matrix()
+        if correlation_rank is None:
+            self.correlation_matrix = self.estimate_condensed_correlation_matrix()
+        else:
+            self.correlation_matrix = self.estimate_low_rank_correlation_matrix(
+                correlation_rank, power_iterations=correlation_power_iterations, oversamples=correlation_oversamples)
 
-    def _get_top_correlated_securities_with(self, target, count=10):
+    def _get_top_correlated_securities_with(self, target, count=10, correlation_matrix=None):
         """
         Estimates the top strongest correlated futures with the target future.
 
         :param target: the target future.
         :param count: the count of the top strongest (weakest) correlated futures. Default: 10.
+        :param correlation_matrix: the correlation matrix to use. Default: the instance's correlation matrix.
         :return: None
         """
         if target not in self.futures_list:
             raise TypeError(
                 f'DataProcessor.get_highest_correlated_securities_with(): Security {target} not present in correlation matrix')
-        count = min(len(self.futures_list) - 1, count)
-        sorted_correlation_matrix = self.correlation_matrix.abs().sort_values(by=target)
-        highest_correlated = sorted_correlation_matrix.index[-count - 1:-1][::-1]
-        lowest_correlated = sorted_correlation_matrix.index[:count]
+        if correlation_matrix is None:
+            correlation_matrix = self.correlation_matrix
+        # The target is dropped by label, approximate matrices can have other futures tied with its own correlation.
+        # Futures without a correlation with the target, e.g. without prices, are neither strong nor weak.
+        sorted_correlations = correlation_matrix.row(target).drop(target).dropna().abs().sort_values()
+        count = min(len(sorted_correlations), count)
+        highest_correlated = sorted_correlations.index[len(sorted_correlations) - count:][::-1]
+        lowest_correlated = sorted_correlations.index[:count]
         return highest_correlated, lowest_correlated
 
     def get_correlation_matrices_respect_to(self, target, count=10):
@@ -53,8 +413,8 @@ class DataProcessor:
         highest_correlated, lowest_correlated = self._get_top_correlated_securities_with(target, count)
         highest_correlated = [target, *highest_correlated]
         lowest_correlated = [target, *lowest_correlated]
-        return {'HighestCorrelated': self.correlation_matrix.loc[highest_correlated, highest_correlated],
-                'LowestCorrelated': self.correlation_matrix.loc[lowest_correlated, lowest_correlated]}
+        return {'HighestCorrelated': self.correlation_matrix.submatrix(highest_correlated),
+                'LowestCorrelated': self.correlation_matrix.submatrix(lowest_correlated)}
 
     def estimate_positive_negative_days_statistics(self):
         """
@@ -67,26 +427,97 @@ class DataProcessor:
 
         :return: a pandas DataFrame with the mentioned statistics for all futures.
         """
-        positive_days = self.daily_pct_change[self.daily_pct_change > 0]
-        positive_days_count = positive_days.count()
-        positive_days_pct = positive_days_count / self.daily_pct_change.count()
-        negative_days = self.daily_pct_change[self.daily_pct_change < 0]
-        negative_days_count = negative_days.count()
-        negative_days_pct = negative_days_count / self.daily_pct_change.count()
-        dic_positive_days = {'Days count': positive_days_count,
-                             'Days count (%)': positive_days_pct,
-                             'Days changes mean (%)': positive_days.mean(),
-                             'Days changes mean (USDT)': self.daily_first_diff[self.daily_first_diff > 0].mean()}
-        dic_negative_days = {'Days count': negative_days_count,
-                             'Days count (%)': negative_days_pct,
-                             'Days changes mean (%)': negative_days.mean(),
-                             'Days changes mean (USDT)': self.daily_first_diff[self.daily_first_diff < 0].mean()}
-        positive_days_stats = pd.concat(dic_positive_days.values(), axis=1, keys=dic_positive_days.keys()).transpose()
-        negative_days_stats = pd.concat(dic_negative_days.values(), axis=1, keys=dic_negative_days.keys()).transpose()
-        df_dic = {'Positive days': positive_days_stats, 'Negative days': negative_days_stats}
-        return (pd.concat(df_dic.values(), axis=1, keys=df_dic.keys())
-                .swaplevel(axis=1)
-                .reindex(self.futures_list, axis=1, level=0))
+        moves_statistics = self.estimate_moves_statistics(horizons={'Daily': '1D'}, thresholds=[0])
+        days_statistics = (moves_statistics.xs(('Daily', 0), level=('Horizon', 'Threshold'))
+                           .astype(float)
+                           .rename(columns={'Count': 'Days count', 'Count (%)': 'Days count (%)',
+                                            'Changes mean (%)': 'Days changes mean (%)',
+                                            'Changes mean (USDT)': 'Days changes mean (USDT)'})
+                           .rename(index={'Positive': 'Positive days', 'Negative': 'Negative days'}, level=0)
+                           .transpose()
+                           .swaplevel(axis=1)
+                           .reindex(self.futures_list, axis=1, level=0))
+        days_statistics.columns.names = [None, None]
+        days_statistics.index.name = None
+        return days_statistics
+
+    def estimate_moves_statistics(self, horizons={'Hourly': '1h', '4 Hours': '4h', 'Daily': '1D', 'Weekly': '1W'},
+                                  thresholds=(0, 0.01, 0.03, 0.05)):
+        """
+        Estimates the following statistics:
+            - Count
+            - Count (%)
+            - Changes mean (%)
+            - Changes mean (USDT)
+        for the positive moves above each threshold and the negative moves below each threshold's negative, for all
+        horizons and futures.
+
+        For each horizon, every move is assigned to a bin delimited by the thresholds in a single pass, and the
+        statistics of all thresholds are obtained from the cumulative counts and sums of those bins.
+
+        :param horizons: a dictionary with the horizon name as key and the offset string as value.
+        :param thresholds: the moves' thresholds, e.g. 0.01 means positive moves above 1% and negative moves below -1%.
+        :return: a pandas DataFrame indexed by horizon, threshold, direction and future with the mentioned statistics.
+        """
+        thresholds = np.unique(np.abs(np.asarray(thresholds, dtype=float)))
+        statistics = []
+        for horizon in horizons:
+            price_series = self.hourly_price_series.resample(horizons[horizon]).last()
+            pct_change = price_series.pct_change().to_numpy()
+            first_diff = price_series.diff()
+            # The USDT changes are split by the sign of their own relative change, without filling missing prices.
+            first_diff_pct_change = (first_diff / price_series.shift()).to_numpy()
+            positive_pct, negative_pct = self._count_and_sum_moves(pct_change, pct_change, thresholds)
+            positive_usdt, negative_usdt = self._count_and_sum_moves(first_diff_pct_change, first_diff.to_numpy(),
+                                                                     thresholds)
+            moves_count = np.count_nonzero(~np.isnan(pct_change), axis=0)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                for (count, pct_sum), (usdt_count, usdt_sum) in ((positive_pct, positive_usdt),
+                                                                 (negative_pct, negative_usdt)):
+                    statistics.append([count, count / moves_count, pct_sum / count, usdt_sum / usdt_count])
+        # Stack into (horizon, direction, statistic, threshold, future) and move the direction after the threshold.
+        statistics = np.array(statistics).reshape(len(horizons), 2, 4, len(thresholds), len(self.futures_list))
+        statistics = statistics.transpose(2, 0, 3, 1, 4).reshape(4, -1)
+        index = pd.MultiIndex.from_product([list(horizons), thresholds, ['Positive', 'Negative'], self.futures_list],
+                                           names=['Horizon', 'Threshold', 'Direction', 'Future'])
+        return pd.DataFrame({'Count': statistics[0].astype(int),
+                             'Count (%)': statistics[1],
+                             'Changes mean (%)': statistics[2],
+                             'Changes mean (USDT)': statistics[3]}, index=index)
+
+    @staticmethod
+    def _count_and_sum_moves(changes, values, thresholds):
+        """
+        Counts and sums the values whose change is above each threshold, and the values whose change is below each
+        threshold's negative, for all futures at once.
+
+        :param changes: a numpy array with the relative changes of all futures, one future per column.
+        :param values: a numpy array with the same shape as changes, with the values to sum.
+        :param thresholds: a sorted numpy array with non-negative thresholds.
+        :return: two tuples (count, sum) for the positive and negative moves, each array with one row per threshold.
+        """
+        edges = np.concatenate([-thresholds[::-1], thresholds])
+        bins_count = len(edges) + 1
+        futures_count = changes.shape[1]
+        present = ~np.isnan(changes)
+        futures = np.broadcast_to(np.arange(futures_count), changes.shape)[present]
+        changes, values = changes[present], values[present]
+
+        def bins_totals(side):
+            # Count and sum of the moves in each (bin, future), bin b holds the moves with b edges before them.
+            flat_bins = np.searchsorted(edges, changes, side=side) * futures_count + futures
+            return [np.bincount(flat_bins, weights=weights, minlength=bins_count * futures_count)
+                    .reshape(bins_count, futures_count) for weights in (None, values)]
+
+        # With side='left' a move equal to an edge falls before it, so the moves above the threshold t_k are the
+        # ones in the bins after the edge K + k. With side='right' it falls after it, so the moves below -t_k are the
+        # ones in the bins up to the edge K - 1 - k.
+        thresholds_count = len(thresholds)
+        positive_moves = tuple(np.cumsum(totals[::-1], axis=0)[::-1][thresholds_count + 1:]
+                               for totals in bins_totals('left'))
+        negative_moves = tuple(np.cumsum(totals, axis=0)[:thresholds_count][::-1]
+                               for totals in bins_totals('right'))
+        return positive_moves, negative_moves
 
     def estimate_correlation_matrix(self, log_series=True):
         """
@@ -100,6 +531,95 @@ class DataProcessor:
             price_series = np.log(price_series)
         return price_series.corr()
 
+    def estimate_condensed_correlation_matrix(self, log_series=True):
+        """
+        Estimates the correlation matrix for all futures in condensed form, by default it estimates the log of the
+        prices first. Unlike estimate_correlation_matrix(), the dense matrix is never built.
+
+        :param log_series: if True, apply log to all prices series before estimating the correlation matrix.
+                           Default: True.
+        :return: a CondensedCorrelationMatrix instance.
+        """
+        price_series = self.hourly_price_series
+        if log_series:
+            price_series = np.log(price_series)
+        return CondensedCorrelationMatrix.from_series(price_series)
+
+    def estimate_low_rank_correlation_matrix(self, rank=20, log_series=True, power_iterations=2, seed=0,
+                                             oversamples=10):
+        """
+        Approximates the correlation matrix for all futures with a low-rank factor form, by default it estimates the
+        log of the prices first.
+
+        :param rank: the count of factors kept. Higher ranks are more accurate and slower. Default: 20.
+        :param log_series: if True, apply log to all prices series before estimating the correlations. Default: True.
+        :param power_iterations: the count of power iterations of the randomized SVD. Default: 2.
+        :param seed: the seed of the random numbers generator. Default: 0.
+        :param oversamples: the count of extra random directions of the randomized SVD. Default: 10.
+        :return: a LowRankCorrelationMatrix instance.
+        """
+        price_series = self.hourly_price_series
+        if log_series:
+            price_series = np.log(price_series)
+        return LowRankCorrelationMatrix.from_series(price_series, rank, oversamples, power_iterations, seed)
+
+    def estimate_correlation_approximation_error(self, rank=20, count=10, log_series=True, power_iterations=2, seed=0,
+                                                 oversamples=10):
+        """
+        Compares the low-rank approximation of the correlation matrix against the exact one.
+
+        It reports the time spent by each path, the errors over all unique pairs, and the share of the top strongest
+        (weakest) correlated futures of each future that the approximation finds.
+
+        :param rank: the count of factors kept by the approximation. Default: 20.
+        :param count: the count of the top strongest (weakest) correlated futures compared. Default: 10.
+        :param log_series: if True, apply log to all prices series before estimating the correlations. Default: True.
+        :param power_iterations: the count of power iterations of the randomized SVD. Default: 2.
+        :param seed: the seed of the random numbers generator. Default: 0.
+        :param oversamples: the count of extra random directions of the randomized SVD. Default: 10.
+        :return: a pandas Series with the mentioned measures.
+        """
+        start = time.perf_counter()
+        exact = self.estimate_condensed_correlation_matrix(log_series)
+        exact_time = time.perf_counter() - start
+        start = time.perf_counter()
+        approximate = self.estimate_low_rank_correlation_matrix(rank, log_series, power_iterations, seed, oversamples)
+        approximate_time = time.perf_counter() - start
+
+        # The errors are accumulated one row of the upper triangle at a time, so no array as big as all the unique
+        # pairs is allocated.
+        futures_count = len(self.futures_list)
+        max_error, errors_sum, errors_count = np.nan, 0.0, 0
+        start = 0
+        for i in range(futures_count):
+            exact_correlations = exact.values[start + 1:start + futures_count - i]
+            approximate_correlations = approximate.factors[i + 1:] @ approximate.factors[i]
+            errors = np.abs(approximate_correlations - exact_correlations)
+            errors = errors[~np.isnan(errors)]
+            if len(errors) > 0:
+                max_error = np.fmax(max_error, errors.max())
+                errors_sum += errors.sum()
+                errors_count += len(errors)
+            start += futures_count - i
+        highest_overlap, lowest_overlap = [], []
+        for target in self.futures_list:
+            exact_highest, exact_lowest = self._get_top_correlated_securities_with(target, count, exact)
+            approximate_highest, approximate_lowest = self._get_top_correlated_securities_with(target, count,
+                                                                                               approximate)
+            highest_overlap.append(len(exact_highest.intersection(approximate_highest)) / max(len(exact_highest), 1))
+            lowest_overlap.append(len(exact_lowest.intersection(approximate_lowest)) / max(len(exact_lowest), 1))
+        # from_series clamps the rank to the data's shape, report the count of factors actually used.
+        report = pd.Series({'Rank': approximate.factors.shape[1],
+                            'Exact time (s)': exact_time,
+                            'Approximate time (s)': approximate_time,
+                            'Max absolute error': max_error,
+                            'Mean absolute error': errors_sum / errors_count if errors_count else np.nan,
+                            'Strongest correlated overlap (%)': np.mean(highest_overlap),
+                            'Weakest correlated overlap (%)': np.mean(lowest_overlap)})
+        print(f'DataProcessor: Correlation approximation with rank {report["Rank"]:.0f}, max absolute error '
+              f'{report["Max absolute error"]:.4f}, mean absolute error {report["Mean absolute error"]:.4f}.')
+        return report
+
     def estimate_normalized_mean_movement_by_hour(self):
         """
         Estimates the mean movement by hour of the normalized prices series.
@@ -132,6 +652,25 @@ class DataProcessor:
                 .swaplevel(axis=1)
                 .reindex(self.futures_list, axis=1, level=0))
 
+    def estimate_hourly_first_diff(self, normalize=False, absolute_value=False):
+        """
+        Estimates the first differences of the hourly prices series, the movements aggregated by hour.
+
+        :param normalize: if True we normalize the prices before processing. Default False
+        :param absolute_value: if True we use the absolute value of the first differences. Default False
+        :return: a pandas DataFrame with the first differences of all futures.
+        """
+        price_series = self.hourly_price_series
+        if normalize:
+            price_series = ((self.hourly_price_series - self.hourly_price_series.mean()) /
+                            self.hourly_price_series.std())
+
+        first_diff = price_series.diff()
+
+        if absolute_value:
+            first_diff = first_diff.abs()
+        return first_diff
+
     def _estimate_mean_movement_by_hour(self, normalize=False, absolute_value=False):
         """
         Estimate the movement by hour for all the crypto futures in the price series.
@@ -150,18 +689,8 @@ class DataProcessor:
                                mean movement strength.
         :return: a pandas DataFrame with the mean movement by hour over the complete sample
         """
-
-        price_series = self.hourly_price_series
-        if normalize:
-            price_series = ((self.hourly_price_series - self.hourly_price_series.mean()) /
-                            self.hourly_price_series.std())
-
-        first_diff = price_series.diff()
-
-        if absolute_value:
-            first_diff = first_diff.abs()
-
-        hour = pd.to_timedelta(price_series.index.hour, unit='H')
+        first_diff = self.estimate_hourly_first_diff(normalize, absolute_value)
+        hour = pd.to_timedelta(first_diff.index.hour, unit='H')
         movement_by_hour = first_diff.groupby(hour).mean()
         movement_by_hour['Hour'] = movement_by_hour.index / np.timedelta64(1, 'h')
         normalized_movement_by_hour = movement_by_hour.astype({'Hour': int})
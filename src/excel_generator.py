@@ -9,7 +9,10 @@ from openpyxl.styles import Alignment, Side, Border, NamedStyle, Font, colors
 from openpyxl.styles.numbers import FORMAT_PERCENTAGE_00
 from openpyxl.utils import get_column_letter
 
-from data_processor import DataProcessor
+from data_processor import DataProcessor, LowRankCorrelationMatrix
+
+# Rows of an Excel worksheet, header included.
+excel_max_rows = 1048576
 
 centered_alignment = Alignment(horizontal='center', vertical='center')
 thin_side = Side(border_style="thin", color="000000")
@@ -109,22 +112,26 @@ def create_big_matrix_sheet(wb, sheet_name, table: pd.DataFrame, color_scale_rul
     :return: None
     """
     ws = wb.create_sheet(title=sheet_name)
-    insert_formatted_matrix(ws, table, color_scale_rule)
+    insert_formatted_matrix(ws, table.columns, table.iterrows(), color_scale_rule)
 
 
-def insert_formatted_matrix(ws, table: pd.DataFrame, color_scale_rule):
+def insert_formatted_matrix(ws, columns, rows, color_scale_rule):
     """
     Inserts a table in the given worksheet and applies a conditional formatting rule.
 
+    The rows are consumed one by one, so they can be produced lazily, e.g. from a correlation matrix that is never
+    built in dense form.
+
     :param ws: active worksheet.
-    :param table: a pandas Dataframe with the data to insert.
+    :param columns: the table's headers.
+    :param rows: an iterable of (label, values) tuples, e.g. DataFrame.iterrows().
     :param color_scale_rule: a color scale rule to apply to the table.
     :return: None
     """
-    ws.append(['', *table.columns.to_list()])
+    ws.append(['', *columns])
     table_first_row = ws.max_row
-    for row in table.iterrows():
-        ws.append([row[0], *row[1].values])
+    for label, values in rows:
+        ws.append([label, *values])
     table_headers_range = f'A{table_first_row}:{get_column_letter(ws.max_column)}{table_first_row}'
     set_style(ws, table_headers_range, centered_bold_style)
     table_index_range = f'A{table_first_row}:A{ws.max_row}'
@@ -147,28 +154,47 @@ class ExcelGenerator:
                It's a proxy of the movement strength by hour.
              * 4_NormalizedMovementByHour: this is plot with the mean of all columns in the previous table,
                normalized to 1. This plot summarizes the movement strength across all data processed by the DataProcessor.
-             * 5_CorrelationMatrix: the correlation matrix of all futures in a huge table.
+             * 5_CorrelationMatrix: the correlation matrix of all futures in a huge table. It is skipped when the
+               correlation matrix is approximated.
+             * 99_UnstackedCorrelationMatrix: a hidden sheet with every unique pair of futures and its correlation.
         - Future-specific workbook: for all futures in the processed data, we create a workbook, it contains:
             * Correlation matrix of the top 10 strongest correlated futures with the selected future.
             * Correlation matrix of the top 10 weakest correlated futures with the selected future.
             * Statistics of all positive and negatives days in the complete data set.
-            * Mean movement in USDT by hours and its strength.
+            * Mean movement in USDT by hours and its strength, and its confidence interval if a bootstrap estimator is
+              given.
     """
-    def __init__(self, destination_folder: Path, data_processor: DataProcessor):
+    def __init__(self, destination_folder: Path, data_processor: DataProcessor, correlation_threshold=None,
+                 bootstrap_estimator=None):
         """
         Initializes an instance of the ExcelGenerator class.
 
         :param destination_folder: the folder where all excel files will be saved. If the folder doesn't exist,
                                    it is created.
         :param data_processor: an instance of DataProcessor.
+        :param correlation_threshold: if given, the unstacked correlation matrix only includes the pairs whose
+                                      correlation in absolute value is greater or equal to it. Default: None.
+        :param bootstrap_estimator: if given, an instance of BootstrapEstimator used to add confidence intervals next
+                                    to the unstacked correlations and the mean movement by hour. Default: None.
         """
+        if isinstance(data_processor.correlation_matrix, LowRankCorrelationMatrix) and correlation_threshold is None:
+            raise ValueError(
+                'ExcelGenerator.__init__(): A correlation threshold is required when the correlation matrix is '
+                'approximated, the unstacked correlation sheet would list every pair of futures otherwise.')
         if not destination_folder.exists():
             destination_folder.mkdir(parents=True, exist_ok=True)
         print(f'ExcelGenerator: initializing, output data will be saved in {destination_folder.absolute()}.')
         self.destination_folder = destination_folder
         self.data_processor = data_processor
+        self.correlation_threshold = correlation_threshold
         self.positive_negative_days_statistics = data_processor.estimate_positive_negative_days_statistics()
         self.mean_movement_and_strength_by_hour = data_processor.estimate_mean_movement_and_strength_by_hour()
+        self.correlation_confidence_intervals = None
+        self.mean_movement_confidence_intervals = None
+        if bootstrap_estimator is not None:
+            self.correlation_confidence_intervals = bootstrap_estimator.estimate_correlation_confidence_intervals()
+            self.mean_movement_confidence_intervals = (
+                bootstrap_estimator.estimate_mean_movement_by_hour_confidence_intervals())
 
     def run(self):
         """
@@ -193,7 +219,11 @@ class ExcelGenerator:
         self._create_movement_by_hour_sheet(wb)
         self._create_absolute_movement_by_hour_sheet(wb)
         self._create_normalized_movement_by_hour_sheet(wb)
-        self._create_correlation_matrix_sheet(wb)
+        if isinstance(self.data_processor.correlation_matrix, LowRankCorrelationMatrix):
+            # The approximate mode is meant for universes too big for a dense N x N sheet.
+            print('ExcelGenerator: skipping 5_CorrelationMatrix, the correlation matrix is approximated.')
+        else:
+            self._create_correlation_matrix_sheet(wb)
         self._create_unstacked_correlation_matrix_sheet(wb)
         xlsx_file_path = self.destination_folder / "all_futures_tables.xlsx"
         wb.save(xlsx_file_path.resolve())
@@ -228,15 +258,19 @@ class ExcelGenerator:
         :param target: the specific future.
         :return: None
         """
-        insert_table_tittle(ws, 'Mean Movement by Hour', 3)
         table = self.mean_movement_and_strength_by_hour[target]
+        if self.mean_movement_confidence_intervals is not None:
+            intervals = self.mean_movement_confidence_intervals[target][['Lower', 'Upper']]
+            table = table.join(intervals.rename(columns={'Lower': 'Lower (USDT)', 'Upper': 'Upper (USDT)'}))
+        table_last_column = get_column_letter(len(table.columns) + 1)
+        insert_table_tittle(ws, 'Mean Movement by Hour', len(table.columns) + 1)
         ws.append(['Hour', *table.columns.to_list()])
         table_first_row = ws.max_row
         for row in table.iterrows():
             ws.append([row[0], *row[1].values])
         table_last_row = ws.max_row
         # Format table
-        table_headers_range = f'A{table_first_row}:C{table_first_row}'
+        table_headers_range = f'A{table_first_row}:{table_last_column}{table_first_row}'
         set_style(ws, table_headers_range, centered_bold_style)
         table_index_range = f'A{table_first_row}:A{table_last_row}'
         set_style(ws, table_index_range, centered_bold_style)
@@ -244,7 +278,7 @@ class ExcelGenerator:
         ws.conditional_formatting.add(mean_movement_range, ryg_color_scale_rule)
         movement_strength_range = f'C{table_first_row + 1}:C{table_last_row}'
         ws.conditional_formatting.add(movement_strength_range, blue_bar_rule)
-        set_columns_width(ws, 25, 2, 3)
+        set_columns_width(ws, 25, 2, len(table.columns) + 1)
 
     def _insert_positive_negative_statistics(self, ws, target):
         """
@@ -290,10 +324,12 @@ class ExcelGenerator:
         # Insert correlation matrices
         corr_matrices = self.data_processor.get_correlation_matrices_respect_to(target, top_count)
         insert_table_tittle(ws, f'Strongest correlations with {target}', matrices_cell_width)
-        insert_formatted_matrix(ws, corr_matrices['HighestCorrelated'], ry_color_scale_rule)
+        table = corr_matrices['HighestCorrelated']
+        insert_formatted_matrix(ws, table.columns, table.iterrows(), ry_color_scale_rule)
         ws.append([''])
         insert_table_tittle(ws, f'Weakest correlations with {target}', matrices_cell_width)
-        insert_formatted_matrix(ws, corr_matrices['LowestCorrelated'], gy_color_scale_rule)
+        table = corr_matrices['LowestCorrelated']
+        insert_formatted_matrix(ws, table.columns, table.iterrows(), gy_color_scale_rule)
         ws.append([''])
 
     def _create_futures_index_sheet(self, wb, batch_size=10):
@@ -373,24 +409,53 @@ class ExcelGenerator:
         :param wb: active workbook.
         :return: None
         """
-        table = self.data_processor.correlation_matrix
         sheet_name = '5_CorrelationMatrix'
-        create_big_matrix_sheet(wb, sheet_name, table, rg_color_scale_rule)
-        set_columns_width(wb[sheet_name], 15, 1, 1)
+        ws = wb.create_sheet(title=sheet_name)
+        correlation_matrix = self.data_processor.correlation_matrix
+        # The rows are estimated while they are written, the dense matrix is never built.
+        rows = ((label, correlation_matrix.row(label)) for label in correlation_matrix.labels)
+        insert_formatted_matrix(ws, correlation_matrix.labels, rows, rg_color_scale_rule)
+        set_columns_width(ws, 15, 1, 1)
 
     def _create_unstacked_correlation_matrix_sheet(self, wb, hidden=True):
         """
         Creates the UnstackedCorrelationMatrix in the 'all_futures_tables.xls' file. By default, this sheet is hidden
         because it is used as source of the DynamicCorrelationMatrix pivot table.
 
+        Each pair of futures is written once, self-pairs and mirrored pairs are skipped. If the generator was created
+        with a correlation threshold, only the pairs whose correlation in absolute value reach it are written.
+        If the generator was created with a bootstrap estimator, the Lower and Upper bounds of each correlation are
+        written next to it.
+        The sheet is skipped if the pairs don't fit in an Excel sheet.
+
         :param wb: active workbook.
         :param hidden: if True, the sheet will be hidden. Default: True
         :return: None
         """
+        correlation_matrix = self.data_processor.correlation_matrix
+        if self.correlation_confidence_intervals is None:
+            header = ['THIS', 'OTHER', 'Correlation']
+            if self.correlation_threshold is None:
+                pairs_count = len(correlation_matrix) * (len(correlation_matrix) - 1) // 2
+            else:
+                pairs_count = sum(len(unique_pairs)
+                                  for unique_pairs in correlation_matrix.iter_unique_pairs(self.correlation_threshold))
+            blocks = correlation_matrix.iter_unique_pairs(self.correlation_threshold)
+        else:
+            header = ['THIS', 'OTHER', 'Correlation', 'Lower', 'Upper']
+            intervals = self.correlation_confidence_intervals
+            if self.correlation_threshold is not None:
+                intervals = intervals[intervals['Correlation'].abs() >= self.correlation_threshold]
+            pairs_count = len(intervals)
+            blocks = [intervals]
+        if pairs_count + 1 > excel_max_rows:
+            print(f'ExcelGenerator: skipping 99_UnstackedCorrelationMatrix, {pairs_count} pairs exceed the '
+                  f'{excel_max_rows} rows of an Excel sheet, use a higher correlation threshold.')
+            return
         ws = wb.create_sheet(title="99_UnstackedCorrelationMatrix")
-        ws.append(['THIS', 'OTHER', 'Correlation'])
-        unstacked_correlation = self.data_processor.correlation_matrix.unstack()
-        for row in unstacked_correlation.items():
-            ws.append([*row[0], row[1]])
+        ws.append(header)
+        for unique_pairs in blocks:
+            for row in unique_pairs.itertuples(index=False, name=None):
+                ws.append(row)
         if hidden:
             ws.sheet_state = 'hidden'
@@ -4,6 +4,7 @@ from pathlib import Path
 
 import pandas as pd
 
+from bootstrap_estimator import BootstrapEstimator
 from data_processor import DataProcessor
 from excel_generator import ExcelGenerator
 
@@ -12,7 +13,24 @@ if __name__ == '__main__':
     parser.add_argument('price_series_path', type=str, help='Path to the CSV file with all the hourly prices series.')
     parser.add_argument('destination_folder', type=str,
                         help='Path to the folder where all output files will be stored.')
+    parser.add_argument('--correlation-threshold', type=float, default=None,
+                        help='Only export to the unstacked correlation sheet the pairs whose correlation in absolute '
+                             'value is greater or equal to this threshold.')
+    parser.add_argument('--correlation-rank', type=int, default=None,
+                        help='Approximate the correlation matrix with this count of factors instead of estimating it '
+                             'exactly. Useful for very large universes.')
+    parser.add_argument('--correlation-power-iterations', type=int, default=2,
+                        help='Count of power iterations of the randomized SVD used with --correlation-rank. More '
+                             'iterations are more accurate and slower.')
+    parser.add_argument('--correlation-oversamples', type=int, default=10,
+                        help='Count of extra random directions of the randomized SVD used with --correlation-rank.')
+    parser.add_argument('--bootstrap-resamples', type=int, default=None,
+                        help='Add bootstrap confidence intervals, estimated with this count of resamples, next to the '
+                             'unstacked correlations and the mean movement by hour.')
     args = parser.parse_args()
+    if args.correlation_rank is not None and args.correlation_threshold is None:
+        parser.error('--correlation-rank requires --correlation-threshold, the unstacked correlation sheet would list '
+                     'every pair of futures otherwise.')
 
     csv_path = Path(args.price_series_path)
     destination_folder = Path(args.destination_folder)
@@ -22,8 +40,13 @@ if __name__ == '__main__':
 
     print(f'ArkansasCryptoFutures: Reading hourly prices from {csv_path.absolute()}')
     hourly_price_series = pd.read_csv(csv_path.resolve(), index_col=0, parse_dates=True)
-    data_processor = DataProcessor(hourly_price_series)
-    excel_generator = ExcelGenerator(destination_folder, data_processor)
+    data_processor = DataProcessor(hourly_price_series, args.correlation_rank, args.correlation_power_iterations,
+                                   args.correlation_oversamples)
+    bootstrap_estimator = None
+    if args.bootstrap_resamples is not None:
+        bootstrap_estimator = BootstrapEstimator(data_processor, resamples=args.bootstrap_resamples)
+    excel_generator = ExcelGenerator(destination_folder, data_processor, args.correlation_threshold,
+                                     bootstrap_estimator)
 
     try:
         excel_generator.run()
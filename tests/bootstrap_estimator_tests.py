@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+from ArkansasCryptoFutures.src.bootstrap_estimator import BootstrapEstimator
+from ArkansasCryptoFutures.src.data_processor import DataProcessor
+
+
+def test_correlation_confidence_intervals():
+    # Arrange
+    testing_data = pd.read_csv('test_data/testing_data_five_series.csv', index_col=0, parse_dates=True)
+    data_processor = DataProcessor(testing_data)
+    bootstrap_estimator = BootstrapEstimator(data_processor, resamples=50, block_size=6, max_workers=1, seed=7)
+
+    # Act
+    actual_results = bootstrap_estimator.estimate_correlation_confidence_intervals()
+    repeated_results = bootstrap_estimator.estimate_correlation_confidence_intervals()
+
+    # Assert
+    point_estimates = actual_results[['THIS', 'OTHER', 'Correlation']]
+    assert_frame_equal(data_processor.correlation_matrix.unique_pairs(), point_estimates)
+    assert_frame_equal(actual_results, repeated_results)
+    assert (actual_results['Lower'] <= actual_results['Upper']).all()
+    assert actual_results['Lower'].between(-1, 1).all() and actual_results['Upper'].between(-1, 1).all()
+
+
+def test_mean_movement_by_hour_confidence_intervals():
+    # Arrange
+    testing_data = pd.read_csv('test_data/testing_data_two_series.csv', index_col=0, parse_dates=True)
+    data_processor = DataProcessor(testing_data)
+    bootstrap_estimator = BootstrapEstimator(data_processor, resamples=50, block_size=1, max_workers=1)
+    expected_mean_movement = data_processor.estimate_normalized_mean_movement_by_hour()
+
+    # Act
+    actual_results = bootstrap_estimator.estimate_mean_movement_by_hour_confidence_intervals(normalize=True)
+
+    # Assert
+    for future in data_processor.futures_list:
+        np.testing.assert_allclose(expected_mean_movement[future], actual_results[future]['Mean Movement'])
+        assert (actual_results[future]['Lower'] <= actual_results[future]['Upper']).all()
+
+
+def test_correlation_confidence_intervals_with_low_rank_correlation_matrix():
+    # Arrange
+    testing_data = pd.read_csv('test_data/testing_data_five_series.csv', index_col=0, parse_dates=True)
+    exact_data_processor = DataProcessor(testing_data)
+    data_processor = DataProcessor(testing_data, correlation_rank=1)
+    bootstrap_estimator = BootstrapEstimator(data_processor, resamples=50, block_size=6, max_workers=1, seed=7)
+
+    # Act
+    actual_results = bootstrap_estimator.estimate_correlation_confidence_intervals()
+
+    # Assert
+    point_estimates = actual_results[['THIS', 'OTHER', 'Correlation']]
+    assert_frame_equal(exact_data_processor.correlation_matrix.unique_pairs(), point_estimates)
+
+
+def test_pooled_and_serial_resamples_are_identical():
+    # Arrange
+    testing_data = pd.read_csv('test_data/testing_data_five_series.csv', index_col=0, parse_dates=True)
+    data_processor = DataProcessor(testing_data)
+    serial_estimator = BootstrapEstimator(data_processor, resamples=20, block_size=6, batch_size=4, max_workers=1)
+    pooled_estimator = BootstrapEstimator(data_processor, resamples=20, block_size=6, batch_size=4, max_workers=2)
+
+    # Act
+    serial_correlations = serial_estimator.estimate_correlation_confidence_intervals()
+    pooled_correlations = pooled_estimator.estimate_correlation_confidence_intervals()
+    serial_mean_movement = serial_estimator.estimate_mean_movement_by_hour_confidence_intervals()
+    pooled_mean_movement = pooled_estimator.estimate_mean_movement_by_hour_confidence_intervals()
+
+    # Assert
+    assert_frame_equal(serial_correlations, pooled_correlations)
+    assert_frame_equal(serial_mean_movement, pooled_mean_movement)
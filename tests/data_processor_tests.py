@@ -1,7 +1,8 @@
 import pandas as pd
-from pandas.testing import assert_frame_equal
+import pytest
+from pandas.testing import assert_frame_equal, assert_series_equal
 
-from ArkansasCryptoFutures.src.data_processor import DataProcessor
+from ArkansasCryptoFutures.src.data_processor import CondensedCorrelationMatrix, DataProcessor
 
 
 def test_correlation_matrices():
@@ -21,6 +22,110 @@ def test_correlation_matrices():
         assert_frame_equal(expected_results, actual_results[key])
 
 
+def test_condensed_correlation_matrix():
+    # Arrange
+    testing_data = pd.read_csv('test_data/testing_data_five_series.csv', index_col=0, parse_dates=True)
+    data_processor = DataProcessor(testing_data)
+    expected_results = data_processor.estimate_correlation_matrix()
+    futures_count = len(data_processor.futures_list)
+
+    # Act
+    correlation_matrix = data_processor.correlation_matrix
+    unique_pairs = correlation_matrix.unique_pairs()
+    strong_pairs = correlation_matrix.unique_pairs(threshold=0.8)
+
+    # Assert
+    assert correlation_matrix.values.size == futures_count * (futures_count + 1) // 2
+    assert_frame_equal(expected_results, correlation_matrix.to_frame())
+    assert_series_equal(expected_results['ETHUSDT'], correlation_matrix.row('ETHUSDT'))
+    assert correlation_matrix['ADAUSDT', 'LINKUSDT'] == pytest.approx(expected_results.loc['LINKUSDT', 'ADAUSDT'])
+    assert len(unique_pairs) == futures_count * (futures_count - 1) // 2
+    for this, other, correlation in unique_pairs.itertuples(index=False, name=None):
+        assert this < other
+        assert correlation == pytest.approx(expected_results.loc[this, other])
+    assert (strong_pairs['Correlation'].abs() >= 0.8).all()
+    assert len(strong_pairs) == (unique_pairs['Correlation'].abs() >= 0.8).sum()
+
+
+def test_low_rank_correlation_matrix():
+    # Arrange
+    target = 'BTCUSDT'
+    testing_data = pd.read_csv('test_data/testing_data_five_series.csv', index_col=0, parse_dates=True)
+    high_correlation_expected_results = pd.read_csv('test_data/highest_correlated_expected_results.csv', index_col=0)
+    data_processor = DataProcessor(testing_data, correlation_rank=len(testing_data.columns))
+
+    # Act
+    actual_results = data_processor.get_correlation_matrices_respect_to(target, 2)
+    approximation_error = data_processor.estimate_correlation_approximation_error(rank=len(testing_data.columns))
+
+    # Assert
+    assert_frame_equal(high_correlation_expected_results, actual_results['HighestCorrelated'])
+    assert approximation_error['Max absolute error'] < 1e-10
+    assert approximation_error['Strongest correlated overlap (%)'] == 1
+    assert data_processor.estimate_correlation_approximation_error(rank=100)['Rank'] == len(testing_data.columns)
+
+
+def test_low_rank_correlated_securities_exclude_target():
+    # Arrange
+    testing_data = pd.read_csv('test_data/testing_data_five_series.csv', index_col=0, parse_dates=True)
+    count = 3
+    data_processor = DataProcessor(testing_data, correlation_rank=1)
+
+    for target in data_processor.futures_list:
+        # Act
+        actual_results = data_processor.get_correlation_matrices_respect_to(target, count)
+
+        # Assert
+        for correlation_matrix in actual_results.values():
+            assert correlation_matrix.index[0] == target
+            assert len(set(correlation_matrix.index)) == count + 1
+
+
+@pytest.mark.parametrize('correlation_rank', [None, 2])
+def test_correlated_securities_exclude_futures_without_prices(correlation_rank):
+    # Arrange
+    testing_data = pd.read_csv('test_data/testing_data_five_series.csv', index_col=0, parse_dates=True)
+    testing_data['F'] = float('nan')
+    data_processor = DataProcessor(testing_data, correlation_rank=correlation_rank)
+    target = data_processor.futures_list[0]
+
+    # Act
+    actual_results = data_processor.get_correlation_matrices_respect_to(target, count=10)
+
+    # Assert
+    for correlation_matrix in actual_results.values():
+        assert 'F' not in correlation_matrix.index
+        assert len(correlation_matrix) == len(testing_data.columns) - 1
+
+
+def test_low_rank_randomized_svd_settings():
+    # Arrange
+    testing_data = pd.read_csv('test_data/testing_data_five_series.csv', index_col=0, parse_dates=True)
+    expected_results = DataProcessor(testing_data).estimate_low_rank_correlation_matrix(2, power_iterations=0,
+                                                                                        oversamples=1)
+
+    # Act
+    data_processor = DataProcessor(testing_data, correlation_rank=2, correlation_power_iterations=0,
+                                   correlation_oversamples=1)
+
+    # Assert
+    assert_frame_equal(expected_results.to_frame(), data_processor.correlation_matrix.to_frame())
+
+
+def test_low_rank_unique_pairs_by_blocks():
+    # Arrange
+    testing_data = pd.read_csv('test_data/testing_data_five_series.csv', index_col=0, parse_dates=True)
+    data_processor = DataProcessor(testing_data, correlation_rank=2)
+    expected_results = CondensedCorrelationMatrix.from_frame(data_processor.correlation_matrix.to_frame())
+
+    # Act
+    actual_results = pd.concat(data_processor.correlation_matrix.iter_unique_pairs(threshold=0.5, block_size=2),
+                               ignore_index=True)
+
+    # Assert
+    assert_frame_equal(expected_results.unique_pairs(threshold=0.5), actual_results)
+
+
 def test_mean_movement_and_strength_by_hour():
     # Arrange
     testing_data = pd.read_csv('test_data/testing_data_single_series.csv', index_col=0, parse_dates=True)
@@ -49,6 +154,32 @@ def test_positive_negative_days_statistics():
     assert_frame_equal(expected_results, actual_results)
 
 
+def test_moves_statistics():
+    # Arrange
+    testing_data = pd.read_csv('test_data/testing_data_two_series_two_months.csv', index_col=0, parse_dates=True)
+    horizons = {'4 Hours': '4h', 'Weekly': '1W'}
+    thresholds = [0, 0.01, 0.03]
+    data_processor = DataProcessor(testing_data)
+
+    # Act
+    actual_results = data_processor.estimate_moves_statistics(horizons, thresholds).sort_index()
+
+    # Assert
+    assert len(actual_results) == len(horizons) * len(thresholds) * 2 * len(data_processor.futures_list)
+    for horizon, offset in horizons.items():
+        price_series = data_processor.hourly_price_series.resample(offset).last()
+        pct_change = price_series.pct_change()
+        first_diff = price_series.diff()
+        for threshold in thresholds:
+            for direction, moves in {'Positive': pct_change > threshold, 'Negative': pct_change < -threshold}.items():
+                expected_results = pd.DataFrame({'Count': pct_change[moves].count(),
+                                                 'Count (%)': pct_change[moves].count() / pct_change.count(),
+                                                 'Changes mean (%)': pct_change[moves].mean(),
+                                                 'Changes mean (USDT)': first_diff[moves].mean()})
+                assert_frame_equal(expected_results, actual_results.loc[(horizon, threshold, direction)],
+                                   check_names=False)
+
+
 def test_price_std_ma_series():
     # Arrange
     testing_data = pd.read_csv('test_data/testing_data_two_series_two_months.csv', index_col=0, parse_dates=True)